@@ -0,0 +1,454 @@
+"""Domo API client shared by the MCP server and proxy entry points."""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from time import monotonic
+
+import httpx
+import orjson
+
+
+# Workflow endpoint templates, formatted once per call instead of inline
+# f-strings scattered across the trigger/poll/results code paths.
+TRIGGER_URL_TMPL = "/workflow/v2/triggers/{}/activate"
+STATUS_URL_TMPL = "/workflow/v1/instances/{}/status"
+TRANSACTIONS_URL_TMPL = "/workflow/v1/instances/transactions?instanceId={}"
+
+# How long cached responses stay fresh, in seconds. Schemas change far
+# less often than metadata or roles, so they get a longer window.
+CACHE_TTL_SECONDS = 300
+SCHEMA_CACHE_TTL_SECONDS = 3600
+
+# Constant part of the dataset search payload; per-call fields (filters,
+# count, offset) are layered on top in search_datasets.
+_SEARCH_TEMPLATE = {
+    "entities": ["DATASET"],
+    "combineResults": True,
+    "query": "*",
+    "sort": {
+        "isRelevance": False,
+        "fieldSorts": [{"field": "create_date", "sortOrder": "DESC"}],
+    },
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DomoConfig:
+    """Domo credentials and endpoints, read from the environment exactly once."""
+
+    host: str
+    developer_token: str
+    client_id: str
+    client_secret: str
+    api_base: str
+
+    @classmethod
+    def from_env(cls) -> "DomoConfig":
+        host = os.getenv("DOMO_HOST")
+        if not host:
+            raise RuntimeError("DOMO_HOST environment variable is not set")
+        return cls(
+            host=host,
+            developer_token=os.getenv("DOMO_DEVELOPER_TOKEN"),
+            client_id=os.getenv("DOMO_CLIENT_ID"),
+            client_secret=os.getenv("DOMO_CLIENT_SECRET"),
+            api_base=f"https://{host}/api",
+        )
+
+
+class TokenBucket:
+    """Keep the Domo-facing request rate under a fixed requests-per-second cap."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = monotonic()
+
+    async def acquire(self):
+        while True:
+            now = monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DomoClient:
+    def __init__(self, logger: logging.Logger, config: DomoConfig | None = None):
+        """Initialize the DomoClient with environment variables and constants."""
+        self.config = config or DomoConfig.from_env()
+        self.logger = logger
+
+        self.logger.info("DomoClient initialized with provided credentials.")
+        self.logger.info("DOMO_HOST: %s", self.config.host)
+        self.logger.info("DOMO_CLIENT_ID: %s", self.config.client_id)
+        self._domo = None
+        self._headers = {
+            "X-DOMO-Developer-Token": self.config.developer_token,
+            "Accept": "application/json",
+            # Compressed JSON is 3-10x smaller on the wire; httpx
+            # decompresses transparently.
+            "Accept-Encoding": "gzip, deflate",
+        }
+        # HTTP/2 multiplexes concurrent calls over one keep-alive TLS
+        # connection to the Domo host instead of opening one socket each.
+        self._client = httpx.AsyncClient(
+            base_url=self.config.api_base,
+            http2=True,
+            headers=self._headers,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=8),
+            timeout=httpx.Timeout(30.0, connect=5.0, read=25.0),
+        )
+        self._cache: dict[str, tuple[float, any]] = {}
+        self._sem = asyncio.Semaphore(16)
+        self._bucket = TokenBucket(rate=20, capacity=20)
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+    @property
+    def domo(self):
+        """The pydomo client, constructed on first use.
+
+        Building it eagerly in __init__ performs an OAuth token exchange at
+        server startup even when no pydomo-backed call is ever made.
+        """
+        if self._domo is None:
+            # Imported here because pydomo drags in pandas, which costs
+            # hundreds of ms at server startup if imported at module top.
+            from pydomo import Domo
+
+            self._domo = Domo(client_id=self.config.client_id, client_secret=self.config.client_secret, api_host='api.domo.com')
+        return self._domo
+
+    def _cache_get(self, key: str):
+        """Return a cached value if it is still fresh, else None."""
+        entry = self._cache.get(key)
+        if entry and entry[0] > monotonic():
+            return entry[1]
+        return None
+
+    def _cache_set(self, key: str, value, ttl: float = CACHE_TTL_SECONDS):
+        self._cache[key] = (monotonic() + ttl, value)
+
+    def clear_caches(self):
+        """Drop all cached responses, e.g. after a mutating call."""
+        self._cache.clear()
+
+    async def aclose(self):
+        """Close the HTTP client and its pooled connections."""
+        await self._client.aclose()
+
+    async def make_request(
+        self, url: str, method: str, data: dict = None, nojson: bool = False
+    ) -> dict[str, any] | None:
+        """Make a request to the Domo API with proper error handling.
+
+        Identical GETs that are already in flight are coalesced onto one
+        request so concurrent callers share a single round-trip to Domo.
+        """
+        if method.upper() != "GET":
+            return await self._do_request(url, method, data, nojson)
+
+        key = (url, nojson)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await inflight
+
+        task = asyncio.ensure_future(self._do_request(url, method, data, nojson))
+        self._inflight[key] = task
+        try:
+            return await task
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _do_request(
+        self, url: str, method: str, data: dict = None, nojson: bool = False, raw: bool = False
+    ) -> dict[str, any] | None:
+        # Serialize the body with orjson instead of the stdlib encoder
+        # httpx would use for json=.
+        body = orjson.dumps(data) if data is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else None
+
+        try:
+            async with self._sem:
+                await self._bucket.acquire()
+                response = await self._client.request(method.upper(), url, content=body, headers=headers)
+
+            if response.status_code == 429:
+                # Honor Domo's rate-limit window once before giving up.
+                retry_after = float(response.headers.get("Retry-After", 1))
+                self.logger.warning("Rate limited by Domo, retrying after %s seconds", retry_after)
+                await asyncio.sleep(retry_after)
+                async with self._sem:
+                    await self._bucket.acquire()
+                    response = await self._client.request(method.upper(), url, content=body, headers=headers)
+
+            response.raise_for_status()
+            if raw:
+                return response
+            if nojson:
+                return response.text
+            return orjson.loads(response.content)
+        except httpx.HTTPError as e:
+            # Connection-level failures carry no response; only status
+            # errors have a body worth logging.
+            resp = getattr(e, "response", None)
+            body = resp.text if resp is not None else ""
+            self.logger.error("HTTP request failed: %s\nReturned: %s", e, body)
+            return None
+        except Exception as e:
+            self.logger.error("Unexpected error: %s", e)
+            return None
+    
+    # async def list_events(self): str | dict[str,any]:
+    #     """List all events in the Domo dataset"""
+
+    async def list_datasets(self, limit: int = None) -> str:
+        """List all datasets in the Domo instance, optionally capped at limit rows."""
+        try:
+
+            df = self.domo.ds_list()
+
+            if limit is not None:
+                df = df.head(limit)
+
+            # to_json serializes in C and skips pandas' per-row dict building.
+            result = orjson.loads(df.to_json(orient='records'))
+
+            if result:
+                self.logger.info("Sample result: %s", result[0])
+
+            return result
+        
+        except Exception as e:
+            self.logger.error("Error fetching dataset list: %s", e)
+            return f"Error fetching dataset list: {str(e)}"
+        
+    async def get_dataset_metadata(self, dataset_id: str, refresh: bool = False) -> str:
+        """Get metadata for a Domo dataset."""
+        try:
+            if not refresh:
+                cached = self._cache_get(f"metadata:{dataset_id}")
+                if cached is not None:
+                    return cached
+
+            url = f"/data/v3/datasources/{dataset_id}?part=core"
+            data = await self.make_request(url, "GET")
+
+            if not data:
+                self.logger.warning("No data returned for dataset metadata.")
+                return "Unable to fetch dataset metadata."
+
+            self._cache_set(f"metadata:{dataset_id}", data)
+            return data
+        except Exception as e:
+            self.logger.error("Error fetching dataset metadata: %s", e)
+            return f"Error fetching dataset metadata: {str(e)}"
+
+    async def get_dataset_schema(self, dataset_id: str, refresh: bool = False) -> str:
+        """Get the schema of a Domo dataset."""
+        try:
+            if not refresh:
+                cached = self._cache_get(f"schema:{dataset_id}")
+                if cached is not None:
+                    return cached
+
+            url = f"/data/v2/datasources/{dataset_id}/schemas/latest"
+            data = await self.make_request(url, "GET")
+
+            if not data:
+                self.logger.warning("No data returned for dataset schema.")
+                return "Unable to fetch dataset schema."
+
+            self._cache_set(f"schema:{dataset_id}", data, ttl=SCHEMA_CACHE_TTL_SECONDS)
+            return data
+        except Exception as e:
+            self.logger.error("Error fetching dataset schema: %s", e)
+            return f"Error fetching dataset schema: {str(e)}"
+
+    async def wait_for_instance(self, instance_id: str, timeout_seconds: float) -> str:
+        """Poll a workflow instance until it leaves IN_PROGRESS or times out.
+
+        Sleeps with asyncio and exponential backoff, so the event loop stays
+        free and fast workflows aren't held to one-second poll granularity.
+        The deadline tracks wall-clock time rather than poll count.
+        """
+        status_url = STATUS_URL_TMPL.format(instance_id)
+        deadline = monotonic() + timeout_seconds
+        delay = 0.2
+        status = 'IN_PROGRESS'
+
+        # Bind loop invariants once rather than per iteration.
+        do_request = self._do_request
+        log = self.logger.info
+
+        while status == 'IN_PROGRESS' and monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 2.0)
+
+            response = await do_request(status_url, "GET", raw=True)
+            if response is None:
+                return None
+
+            # A 202 with Retry-After tells us exactly when to check back;
+            # prefer the server's hint over our own backoff schedule.
+            if response.status_code == 202 and "Retry-After" in response.headers:
+                delay = min(float(response.headers["Retry-After"]), 30.0)
+                continue
+
+            status = response.text
+            log("Workflow instance %s status: %s", instance_id, status)
+
+        return status
+
+    async def get_dataset_schemas(self, dataset_ids: list[str]) -> list:
+        """Fetch schemas for several datasets concurrently."""
+        return await asyncio.gather(
+            *(self.get_dataset_schema(dataset_id) for dataset_id in dataset_ids),
+            return_exceptions=True,
+        )
+
+    async def get_dataset_metadatas(self, dataset_ids: list[str]) -> list:
+        """Fetch metadata for several datasets concurrently."""
+        return await asyncio.gather(
+            *(self.get_dataset_metadata(dataset_id) for dataset_id in dataset_ids),
+            return_exceptions=True,
+        )
+
+    async def query_dataset(self, prompt: str) -> str | dict[str,any]:
+        """Query a Domo dataset using SQL."""
+        TriggerId= "57e5928e-3488-4723-9075-2fc4dd1dd092"
+        try:
+            url = TRIGGER_URL_TMPL.format(TriggerId)
+            trigger = await self.make_request(url, "POST", data={"prompt": prompt})
+
+            instance_id = trigger['id']
+            status = trigger['status']
+
+            self.logger.info("the status of the trigger is %s", status)
+
+            if status == 'IN_PROGRESS':
+                status = await self.wait_for_instance(instance_id, timeout_seconds=120)
+
+            results_url = TRANSACTIONS_URL_TMPL.format(instance_id)
+
+            messages = await self.make_request(results_url,"GET")
+
+
+            # self.logger.info(f"Workflow instance {instance_id} messages: {messages}")
+
+            # The result transaction is appended after the status ones, so
+            # scanning in reverse finds it in O(1) instead of walking the list.
+            result_obj = next((item for item in reversed(messages) if item.get("id") == "result"), None)
+
+            self.logger.info("Result object: %s", result_obj)
+
+
+            data = result_obj['value']
+
+            # data = self.domo.ds_query(dataset_id=dataset_id,query=sql)
+
+            # self.logger.info(data)
+
+            if not data:
+                self.logger.warning("No data returned for dataset query. Returned %s", data)
+                return "Unable to execute query on the dataset."
+
+            # Parse big result payloads on a worker thread so the decode
+            # does not stall other tool calls on the event loop.
+            if len(data) > 256_000:
+                return await asyncio.to_thread(orjson.loads, data)
+
+            return orjson.loads(data)
+        
+        except Exception as e:
+            self.logger.error("Error executing query on dataset: %s", e)
+            return f"Error executing query on dataset: {str(e)}"
+
+    async def search_datasets(self, query: str, count: int = 1, offset: int = 0) -> str:
+        """Search for datasets in a Domo instance by name."""
+        try:
+            url = "/data/ui/v3/datasources/search"
+            payload = {
+                **_SEARCH_TEMPLATE,
+                "filters": [
+                    {
+                        "field": "name_sort",
+                        "filterType": "wildcard",
+                        "query": f"*{query}*",
+                    }
+                ],
+                "count": count,
+                "offset": offset,
+            }
+            data = await self.make_request(url, "POST", data=payload)
+
+            if not data:
+                self.logger.warning("No data returned for dataset search.")
+                return "Unable to search datasets."
+
+            datasets = [
+                {"id": ds["id"], "name": ds["name"]}
+                for ds in data.get("dataSources", [])
+            ]
+            return datasets
+        except Exception as e:
+            self.logger.error("Error searching datasets: %s", e)
+            return f"Error searching datasets: {str(e)}"
+
+    async def list_roles(self, refresh: bool = False) -> str:
+        """List all roles in the Domo instance."""
+        try:
+            if not refresh:
+                cached = self._cache_get("roles")
+                if cached is not None:
+                    return cached
+
+            url = "/authorization/v1/roles"
+            data = await self.make_request(url, "GET")
+
+            if not data:
+                self.logger.warning("No data returned for role list.")
+                return "Unable to fetch role list."
+
+            self._cache_set("roles", data)
+            return data
+        except Exception as e:
+            self.logger.error("Error fetching role list: %s", e)
+            return f"Error fetching role list: {str(e)}"
+
+    async def create_role(self, role_data: dict) -> str:
+        """Create a new role in the Domo instance."""
+        try:
+            url = "/authorization/v1/roles"
+            data = await self.make_request(url, "POST", data=role_data)
+
+            if not data:
+                self.logger.warning("No data returned for role creation.")
+                return "Unable to create role."
+
+            # The cached role list is stale now.
+            self.clear_caches()
+            return data
+        except Exception as e:
+            self.logger.error("Error creating role: %s", e)
+            return f"Error creating role: {str(e)}"
+
+    async def list_role_authorities(self, role_id: str) -> str:
+        """List all authorities for a given role."""
+        try:
+            url = f"/authorization/v1/roles/{role_id}/authorities"
+            data = await self.make_request(url, "GET")
+
+            if not data:
+                self.logger.warning("No data returned for role authorities.")
+                return "Unable to fetch role authorities."
+
+            return data
+        except Exception as e:
+            self.logger.error("Error fetching role authorities: %s", e)
+            return f"Error fetching role authorities: {str(e)}"
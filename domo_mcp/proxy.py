@@ -3,12 +3,33 @@ from fastmcp.server.proxy import ProxyClient
 from starlette.responses import JSONResponse
 from starlette.requests import Request
 import logging
-import os
 
-from server import tix_workflow
+from server import ORJSONResponse, tix_workflow
+
+# Route path -> Domo workflow trigger id. Each route runs the same
+# poll-and-filter workflow, only the trigger differs.
+TIX_ROUTES = [
+    ("/tix/aov", "2942b06e-cf4a-4d84-9d57-46735dd5068e"),
+    ("/tix/rawdata", "294469f5-1c4d-44ae-a96f-5f3d01b3a9c1"),
+    ("/tix/tsv", "bf4556d4-2f7c-4cde-b951-83c9fa52a80e"),
+    ("/tix/rcf", "cf668421-0a21-4e60-bd64-e1fe608e33bf"),
+]
+
+
+def make_tix_route(trigger_id: str):
+    async def tix(request: Request) -> JSONResponse:
+        return await tix_workflow(request, triggerId=trigger_id)
+    return tix
+
 
 def main():
 
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     proxy = FastMCP.as_proxy(ProxyClient("./domo_mcp/server.py"))
 
     logging.info("RUNNING THE PROXY SERVER")
@@ -16,27 +37,12 @@ def main():
     # Add a custom route to the proxy's FastAPI app
     @proxy.custom_route("/health",methods=['GET'])
     async def health(request: Request) -> JSONResponse:
-        logging.info(f"{dict(os.environ)}")
-        return JSONResponse({"message": "Hello from custom route!"})
+        return ORJSONResponse({"message": "Hello from custom route!"})
     
-    @proxy.custom_route("/tix/aov",methods=['POST'])
-    async def tix(request: Request) -> JSONResponse:
-        return await tix_workflow(request, triggerId="2942b06e-cf4a-4d84-9d57-46735dd5068e")
-    
-    
-    @proxy.custom_route("/tix/rawdata",methods=['POST'])
-    async def tix_rawdata(request: Request) -> JSONResponse:
-        return await tix_workflow(request, triggerId="294469f5-1c4d-44ae-a96f-5f3d01b3a9c1")
-    
-    @proxy.custom_route("/tix/tsv",methods=['POST'])
-    async def tix_rawdata(request: Request) -> JSONResponse:
-        return await tix_workflow(request, triggerId="bf4556d4-2f7c-4cde-b951-83c9fa52a80e")
-    
-    @proxy.custom_route("/tix/rcf",methods=['POST'])
-    async def tix_rcf(request: Request) -> JSONResponse:
-        return await tix_workflow(request, triggerId="cf668421-0a21-4e60-bd64-e1fe608e33bf")
+    for path, trigger_id in TIX_ROUTES:
+        proxy.custom_route(path, methods=['POST'])(make_tix_route(trigger_id))
+
 
-    
     proxy.settings.host= "0.0.0.0"
     proxy.settings.client_init_timeout=60
     
@@ -1,281 +1,98 @@
+import asyncio
 import logging
+import queue
+import random
 import sys
-from time import sleep
+import threading
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 
+import orjson
 from dotenv import load_dotenv
-from pydomo import Domo
 from fastmcp import FastMCP, Context
 import os
 from starlette.responses import JSONResponse
 from starlette.requests import Request
-import json
+
+from client import DomoClient, TRANSACTIONS_URL_TMPL, TRIGGER_URL_TMPL
+
+
+# Statuses where retrying the workflow again cannot help.
+TERMINAL_FAILURES = {'FAILED', 'CANCELLED', 'TERMINATED'}
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse that serializes with orjson instead of stdlib json."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
 
 
 async def tix_workflow(request: Request, triggerId: str) -> JSONResponse:
 
     data = await request.json()
-    attempts = 5
     status = "uninitialized"
 
-    while status !='COMPLETED' and attempts> 0:
+    for attempt in range(5):
 
         response = await tix_domo(data, TriggerId=triggerId)
 
         status = response.get('status','uninitialized')
-        attempts -= 1
-
-    if status == 'COMPLETED':
-        filtered = [item for item in response['messages'] if item.get("id", "").startswith("result__")]
 
-        return JSONResponse({"status": "completed", "data": filtered})
-    
-    logging.info(f"Received data: {data}")
-    
-    return JSONResponse({"status": response.get('status', 'unknown'), "data": response})
-class DomoClient:
-    def __init__(self, logger: logging.Logger):
-        """Initialize the DomoClient with environment variables and constants."""
-        self.DOMO_HOST = os.getenv("DOMO_HOST")
-        self.DOMO_DEVELOPER_TOKEN = os.getenv("DOMO_DEVELOPER_TOKEN")
-        self.DOMO_CLIENT_ID = os.getenv("DOMO_CLIENT_ID")
-        self.DOMO_CLIENT_SECRET = os.getenv("DOMO_CLIENT_SECRET")
-        self.DOMO_API_BASE = f"https://{self.DOMO_HOST}/api"
-        self.logger = logger
-
-        self.logger.info("DomoClient initialized with provided credentials.")
-        self.logger.info(f"DOMO_HOST: {self.DOMO_HOST}")
-        self.logger.info(f"DOMO_CLIENT_ID: {self.DOMO_CLIENT_ID}")
-        self.logger.info(f"DOMO_CLIENT_SECRET: {self.DOMO_CLIENT_SECRET}")
-        self.domo = Domo(client_id=self.DOMO_CLIENT_ID, client_secret=self.DOMO_CLIENT_SECRET, api_host='api.domo.com')
-
-    async def make_request(
-        self, url: str, method: str, data: dict = None, nojson: bool = False
-    ) -> dict[str, any] | None:
-        """Make a request to the Domo API with proper error handling."""
-        headers = {
-            "X-DOMO-Developer-Token": self.DOMO_DEVELOPER_TOKEN,
-            "Accept": "application/json",
-        }
-
-        full_url = f"{self.DOMO_API_BASE}{url}"
-
-        try:
-            if method.upper() == "GET":
-                response = requests.get(full_url, headers=headers)
-            elif method.upper() == "POST":
-                response = requests.post(full_url, headers=headers, json=data)
-            elif method.upper() == "DELETE":
-                response = requests.delete(full_url, headers=headers)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
-
-            response.raise_for_status()
-            if nojson:
-                return response.text
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            self.logger.error(f"HTTP request failed: {e}\nReturned: {response.text}")
-            return None
-        except Exception as e:
-            self.logger.error(f"Unexpected error: {e}")
-            return None
-    
-    # async def list_events(self): str | dict[str,any]:
-    #     """List all events in the Domo dataset"""
+        if status == 'COMPLETED' or status in TERMINAL_FAILURES:
+            break
 
-    async def list_datasets(self) -> str:
-        """List all datasets in the Domo instance."""
-        try:
+        # Back off with jitter instead of immediately re-triggering the workflow.
+        await asyncio.sleep(min(30, 1.0 * 2 ** attempt) * (1 + random.random() * 0.5))
 
-            result = self.domo.ds_list().to_dict(orient='records')
+    if status == 'COMPLETED':
+        prefix = "result__"
+        filtered = [item for item in response['messages'] if (item_id := item.get("id")) and item_id.startswith(prefix)]
 
-            self.logger.info("Sample result: {}".format(result[0]))
+        return ORJSONResponse({"status": "completed", "data": filtered})
 
-            return result
-        
-        except Exception as e:
-            self.logger.error(f"Error fetching dataset list: {str(e)}")
-            return f"Error fetching dataset list: {str(e)}"
-        
-    async def get_dataset_metadata(self, dataset_id: str) -> str:
-        """Get metadata for a Domo dataset."""
-        try:
-            url = f"/data/v3/datasources/{dataset_id}?part=core"
-            data = await self.make_request(url, "GET")
-
-            if not data:
-                self.logger.warning("No data returned for dataset metadata.")
-                return "Unable to fetch dataset metadata."
-
-            return data
-        except Exception as e:
-            self.logger.error(f"Error fetching dataset metadata: {str(e)}")
-            return f"Error fetching dataset metadata: {str(e)}"
-
-    async def get_dataset_schema(self, dataset_id: str) -> str:
-        """Get the schema of a Domo dataset."""
-        try:
-            url = f"/data/v2/datasources/{dataset_id}/schemas/latest"
-            data = await self.make_request(url, "GET")
-
-            if not data:
-                self.logger.warning("No data returned for dataset schema.")
-                return "Unable to fetch dataset schema."
-
-            return data
-        except Exception as e:
-            self.logger.error(f"Error fetching dataset schema: {str(e)}")
-            return f"Error fetching dataset schema: {str(e)}"
-
-    async def query_dataset(self, prompt: str) -> str | dict[str,any]:
-        """Query a Domo dataset using SQL."""
-        TriggerId= "57e5928e-3488-4723-9075-2fc4dd1dd092"
-        try:
-            url = f"/workflow/v2/triggers/57e5928e-3488-4723-9075-2fc4dd1dd092/activate"
-            trigger = await self.make_request(url, "POST", data={"prompt": prompt})
-
-            instance_id = trigger['id']
-            status = trigger['status']
-
-            self.logger.info(f"the status of the trigger is {status}")
-
-            timeout_seconds = 120
-
-            while status=='IN_PROGRESS' and timeout_seconds>0:
-                status = await self.make_request(f"/workflow/v1/instances/{instance_id}/status", "GET", nojson=True)
-                self.logger.info(f"Workflow instance {instance_id} status: {status}")
-                timeout_seconds -= 1
-                sleep(1)
-
-            results_url = f"/workflow/v1/instances/transactions?instanceId={instance_id}"
-
-            messages = await self.make_request(results_url,"GET")
-
-
-            # self.logger.info(f"Workflow instance {instance_id} messages: {messages}")
-
-            result_obj = next((item for item in messages if item.get("id") == "result"), None)
-
-            self.logger.info(f"Result object: {result_obj}")
-
-
-            data = result_obj['value']
-
-            # data = self.domo.ds_query(dataset_id=dataset_id,query=sql)
-
-            # self.logger.info(data)
-
-            if not data:
-                self.logger.warning("No data returned for dataset query. Returned {}".format(data))
-                return "Unable to execute query on the dataset."
-
-            return json.loads(data)
-        
-        except Exception as e:
-            self.logger.error(f"Error executing query on dataset: {str(e)}")
-            return f"Error executing query on dataset: {str(e)}"
-
-    async def search_datasets(self, query: str) -> str:
-        """Search for datasets in a Domo instance by name."""
-        try:
-            url = "/data/ui/v3/datasources/search"
-            payload = {
-                "entities": ["DATASET"],
-                "filters": [
-                    {
-                        "field": "name_sort",
-                        "filterType": "wildcard",
-                        "query": f"*{query}*",
-                    }
-                ],
-                "combineResults": True,
-                "query": "*",
-                "count": 1,
-                "offset": 0,
-                "sort": {
-                    "isRelevance": False,
-                    "fieldSorts": [{"field": "create_date", "sortOrder": "DESC"}],
-                },
-            }
-            data = await self.make_request(url, "POST", data=payload)
-
-            if not data:
-                self.logger.warning("No data returned for dataset search.")
-                return "Unable to search datasets."
-
-            datasets = [
-                {"id": ds["id"], "name": ds["name"]}
-                for ds in data.get("dataSources", [])
-            ]
-            return datasets
-        except Exception as e:
-            self.logger.error(f"Error searching datasets: {str(e)}")
-            return f"Error searching datasets: {str(e)}"
-
-    async def list_roles(self) -> str:
-        """List all roles in the Domo instance."""
-        try:
-            url = "/authorization/v1/roles"
-            data = await self.make_request(url, "GET")
-
-            if not data:
-                self.logger.warning("No data returned for role list.")
-                return "Unable to fetch role list."
-
-            return data
-        except Exception as e:
-            self.logger.error(f"Error fetching role list: {str(e)}")
-            return f"Error fetching role list: {str(e)}"
-
-    async def create_role(self, role_data: dict) -> str:
-        """Create a new role in the Domo instance."""
-        try:
-            url = "/authorization/v1/roles"
-            data = await self.make_request(url, "POST", data=role_data)
-
-            if not data:
-                self.logger.warning("No data returned for role creation.")
-                return "Unable to create role."
-
-            return data
-        except Exception as e:
-            self.logger.error(f"Error creating role: {str(e)}")
-            return f"Error creating role: {str(e)}"
-
-    async def list_role_authorities(self, role_id: str) -> str:
-        """List all authorities for a given role."""
-        try:
-            url = f"/authorization/v1/roles/{role_id}/authorities"
-            data = await self.make_request(url, "GET")
-
-            if not data:
-                self.logger.warning("No data returned for role authorities.")
-                return "Unable to fetch role authorities."
-
-            return data
-        except Exception as e:
-            self.logger.error(f"Error fetching role authorities: {str(e)}")
-            return f"Error fetching role authorities: {str(e)}"
+    logger.info("Received data: %s", data)
 
+    return ORJSONResponse({"status": response.get('status', 'unknown'), "data": response})
 
 def setup_logger():
-    class Logger:
-        def info(self, message):
-            print(f"[INFO] {message}", file=sys.stderr)
-
-        def warning(self, message):
-            print(f"[WARNING] {message}", file=sys.stderr)
-
-        def error(self, message):
-            print(f"[ERROR] {message}", file=sys.stderr)
+    """Configure the shared logger on stderr (stdout is the MCP transport).
 
-    return Logger()
+    Records are handed to a background QueueListener thread so the event
+    loop only pays for enqueueing, not for the blocking stderr write.
+    """
+    logger = logging.getLogger("domo-mcp")
+    if not logger.handlers:
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        log_queue = queue.SimpleQueue()
+        QueueListener(log_queue, stream).start()
+        logger.addHandler(QueueHandler(log_queue))
+        logger.setLevel(logging.INFO)
+    return logger
 
 logger = setup_logger()
 load_dotenv()
-logger.warning(f"Environment variables loaded: {os.environ}")
+# Only log the non-secret settings; the environment also carries tokens.
+logger.info("Env loaded: DOMO_HOST=%s DOMO_CLIENT_ID=%s", os.getenv("DOMO_HOST"), os.getenv("DOMO_CLIENT_ID"))
 domo_client = DomoClient(logger)
-server = FastMCP("domo-mcp")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Close the HTTP client inside the server's own event loop on exit.
+
+    Closing it after server.run() returns would run on a fresh loop while
+    the pooled connections are still bound to the dead one, which raises
+    'Event loop is closed'.
+    """
+    try:
+        yield
+    finally:
+        await domo_client.aclose()
+
+
+server = FastMCP("domo-mcp", lifespan=lifespan)
 
 
 # @server.tool()
@@ -315,26 +132,23 @@ server = FastMCP("domo-mcp")
 
     # return {"datasets": datasets}
 
-# @server.tool(description="Filter the datasets to only include those of type DATAFLOW or CONNECTOR which are datasets that can be queried, limited to 10 datasets per call")
-# async def FilterDatasets(datasets_ids: list[str],ctx: Context):
+@server.tool(description="Filter the datasets to only include those of type DATAFLOW or CONNECTOR which are datasets that can be queried")
+async def FilterDatasets(datasets_ids: list[str], ctx: Context):
 
-#     count = 1
-    
-#     filtered_datasets = []
+    # Fetch all metadata concurrently instead of one round-trip per dataset.
+    metadatas = await domo_client.get_dataset_metadatas(datasets_ids)
+
+    filtered_datasets = []
 
-#     for dataset_id in datasets_ids:
+    for dataset_id, metadata in zip(datasets_ids, metadatas):
 
-#         metadata = await domo_client.get_dataset_metadata(dataset_id=dataset_id)
+        if isinstance(metadata, dict) and metadata.get("transportType") in ["DATAFLOW", "CONNECTOR"]:
+            domo_client.logger.info("Included dataset %s of type %s", dataset_id, metadata["transportType"])
+            filtered_datasets.append(dataset_id)
 
-#         await ctx.report_progress(progress=count / len(datasets_ids), message=f"Fetched metadata for dataset {dataset_id}")
+    await ctx.report_progress(progress=100, message="Datasets filtered successfully")
 
-#         if "transportType" in metadata.keys() and metadata["transportType"] in ["DATAFLOW", "CONNECTOR"]:
-#             domo_client.logger.info(f"Included dataset {dataset_id} of type {metadata['transportType']}")
-#             filtered_datasets.append(dataset_id)
-        
-#         count +=1
-        
-#     return filtered_datasets
+    return filtered_datasets
 
 # @server.tool()
 # async def GetDatasetMetadata(dataset_id: str, ctx: Context) -> str | dict[str,any]:
@@ -366,7 +180,7 @@ async def SearchDomo(prompt: str, ctx: Context) -> str | dict[str,any]:
     query_results = await domo_client.query_dataset(prompt=prompt)
 
     # results = await domo_client.make_request("/04db5209-1c6c-45ed-a7c9-5cfd82d1487f","GET")
-    logger.info("Query executed successfully.")
+    logger.debug("Query executed successfully.")
     await ctx.report_progress(progress=100, message="Query executed successfully")
     return {"data": query_results}
 
@@ -386,31 +200,26 @@ async def tix_domo(data: dict | None, TriggerId: str ):
 
 
     try:
-        url = f"/workflow/v2/triggers/{TriggerId}/activate"
+        url = TRIGGER_URL_TMPL.format(TriggerId)
         trigger = await domo_client.make_request(url, "POST", data={"venueId": venue_id})
 
         instance_id = trigger['id']
         status = trigger['status']
 
-        domo_client.logger.info(f"the status of the trigger is {status}")
+        domo_client.logger.info("the status of the trigger is %s", status)
 
-        timeout_seconds = 300
+        if status == 'IN_PROGRESS':
+            status = await domo_client.wait_for_instance(instance_id, timeout_seconds=300)
 
-        while status=='IN_PROGRESS' and timeout_seconds>0:
-            status = await domo_client.make_request(f"/workflow/v1/instances/{instance_id}/status", "GET", nojson=True)
-            domo_client.logger.info(f"Workflow instance {instance_id} status: {status}")
-            timeout_seconds -= 1
-            sleep(1)
-
-        results_url = f"/workflow/v1/instances/transactions?instanceId={instance_id}"
+        results_url = TRANSACTIONS_URL_TMPL.format(instance_id)
 
         messages = await domo_client.make_request(results_url,"GET")
 
-        domo_client.logger.info(f"Workflow instance {instance_id} messages: {messages}")
+        domo_client.logger.info("Workflow instance %s messages: %s", instance_id, messages)
         return {"status": status, "messages": messages}
     
     except Exception as e:
-        domo_client.logger.error(f"Error executing tix agent: {str(e)}")
+        domo_client.logger.error("Error executing tix agent: %s", e)
     return True
 
 
@@ -426,10 +235,12 @@ async def tix_domo(data: dict | None, TriggerId: str ):
 #     return search_results
 
 @server.tool()
-async def ListRoles(ctx: Context):
-    """List all roles in the Domo instance."""
-    roles = await domo_client.list_roles()
-    logger.info("Roles listed successfully.")
+async def ListRoles(ctx: Context, refresh: bool = False):
+    """List all roles in the Domo instance.
+    Args: refresh: Skip the cached role list and refetch from Domo.
+    """
+    roles = await domo_client.list_roles(refresh=refresh)
+    logger.debug("Roles listed successfully.")
     await ctx.report_progress(progress=100, message="Roles listed successfully")
     return roles
 
@@ -439,7 +250,7 @@ async def CreateRole(role_data: dict, ctx: Context) -> str:
     Args: role_data: The data for the role to create.
     """
     created_role = await domo_client.create_role(role_data=role_data)
-    logger.info("Role created successfully.")
+    logger.debug("Role created successfully.")
     await ctx.report_progress(progress=100, message="Role created successfully")
     return created_role
 
@@ -449,19 +260,39 @@ async def ListRoleAuthorities(role_id: str, ctx: Context) -> str:
     Args: role_id: The ID of the role to list authorities for.
     """
     result = await domo_client.list_role_authorities(role_id=role_id)
-    logger.info("Authorities listed successfully.")
+    logger.debug("Authorities listed successfully.")
     await ctx.report_progress(progress=100, message="Authorities listed successfully")
     return result
 
 
 
+def _prewarm_domo():
+    """Perform the pydomo OAuth exchange so the first call doesn't pay it."""
+    try:
+        domo_client.domo
+    except Exception as e:
+        logger.warning("pydomo pre-warm failed: %s", e)
+
+
 def main():
     """Run the server."""
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     server.settings.host="0.0.0.0"
     server.settings.port=8001
 
-    server.run()
-    # asyncio.run(mcp.run_streamable_http_async(log_level="debug"))
+    # Warm the token off the main thread; startup doesn't block on it.
+    threading.Thread(target=_prewarm_domo, daemon=True).start()
+
+    # stdio by default; set DOMO_MCP_TRANSPORT=streamable-http to serve
+    # HTTP clients directly without going through the proxy.
+    transport = os.getenv("DOMO_MCP_TRANSPORT", "stdio")
+
+    server.run(transport=transport)
 
 
 if __name__ == "__main__":